@@ -11,19 +11,44 @@ from qgis.PyQt.QtWidgets import (
     QTextBrowser
 )
 from qgis.PyQt.QtGui import QIcon
-from qgis.PyQt.QtCore import QSettings
+from qgis.PyQt.QtCore import QSettings, QTimer, QUrl
+from qgis.PyQt.QtNetwork import QNetworkRequest, QNetworkReply
 from qgis.core import (
-    Qgis, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsProject
+    Qgis, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsCsException,
+    QgsProject, QgsNetworkAccessManager
 )
 from qgis.gui import QgsMapToolEmitPoint
-import requests
+import json
 import logging
 import os
-from datetime import datetime
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+# orjson (opcional) decodifica directamente los bytes de la respuesta, mucho más rápido
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
-logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
+# Fila de datos común a todos los proveedores (una por hora de pronóstico)
+Row = namedtuple("Row", "hora temp feels desc icon hum viento_kmh dir rafaga ciudad")
+
+# Factor de conversión m/s → km/h
+_KMH = 3.6
+
+# Plantilla del popup de "Tiempo Actual"; las claves son los campos de Row
+_POPUP_TEMPLATE = (
+    "<i>{desc} ({api_id})</i><hr>"
+    "Temperatura: <b>{temp} °C</b> (Sens. {feels} °C)<br>"
+    "Humedad: {hum} %<br>"
+    "Viento: {viento_kmh} km/h ({dir} °)<br>"
+    "Ráfaga: {rafaga} km/h"
+)
+
 class ClimaPorClick:
     """
     Plugin QGIS para obtener datos de clima mediante click en el mapa, 
@@ -36,6 +61,8 @@ class ClimaPorClick:
         "AccuWeather (Requiere Key)": "accuweather",
         "Visual Crossing (Requiere Key)": "visualcrossing",
     }
+    API_REVERSE = {v: k for k, v in API_OPTIONS.items()}
+    _KEY_REQUIRED = frozenset(i for n, i in API_OPTIONS.items() if "Requiere Key" in n)
 
     MODOS = ["Tiempo Actual", "Pronóstico 24h", "Pronóstico 36h", "Pronóstico 48h"]
 
@@ -47,6 +74,51 @@ class ClimaPorClick:
         71: ("Nieve ligera", "🌨️"), 73: ("Nieve moderada", "❄️"), 75: ("Nieve intensa", "❄️"),
         95: ("Tormenta", "⛈️"),
     }
+    WMO_UNKNOWN = ("Desconocido", "❓")
+    # Tabla densa 0..99 para traducir códigos WMO por índice en lugar de por hash
+    _WMO_TABLE = tuple(map(WMO_WEATHER_MAP.get, range(100), (WMO_UNKNOWN,) * 100))
+
+    # Códigos de ícono de OpenWeatherMap → emoji
+    ICON_MAP = {
+        '01d': '☀️', '01n': '🌙', '02d': '🌤️', '02n': '🌤️', '03d': '🌥️', '03n': '🌥️',
+        '04d': '☁️', '04n': '☁️', '09d': '🌧️', '09n': '🌧️', '10d': '🌦️', '10n': '🌧️',
+        '11d': '⛈️', '11n': '⛈️', '13d': '❄️', '13n': '❄️', '50d': '🌫️', '50n': '🌫️',
+    }
+
+    # CSS de los popups (tiempo actual y tabla de pronóstico)
+    _CSS_STYLE = """
+        <style>
+            body { font-family: sans-serif; margin: 0; padding: 0; }
+            table { border-collapse: collapse; width: 100%; font-size: 10px; margin-top: 10px; }
+            th, td { border: 1px solid #ddd; padding: 4px; text-align: center; }
+            th { background-color: #f2f2f2; font-weight: bold; }
+            .city-header { font-size: 14px; font-weight: bold; margin-bottom: 5px; }
+            hr { border: 0; border-top: 1px solid #ccc; margin: 5px 0; }
+        </style>
+    """
+
+    # Plantillas de URL de cada API ({key} es siempre la API Key del usuario)
+    OWM_URL_TEMPLATE = "https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={key}&units=metric&lang=es"
+    OWM_FORECAST_URL_TEMPLATE = "https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&appid={key}&units=metric&lang=es&exclude=current,minutely,daily,alerts"
+    OPENMETEO_URL_TEMPLATE = "https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,apparent_temperature,relative_humidity_2m,wind_speed_10m,wind_direction_10m,wind_gusts_10m,weather_code"
+    OPENMETEO_FORECAST_URL_TEMPLATE = "https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&hourly=temperature_2m,apparent_temperature,relative_humidity_2m,wind_speed_10m,wind_direction_10m,weather_code&forecast_hours={horas}"
+    TOMORROWIO_URL_TEMPLATE = "https://api.tomorrow.io/v4/weather/realtime?location={lat},{lon}&apikey={key}&units=metric"
+    TOMORROWIO_FORECAST_URL_TEMPLATE = "https://api.tomorrow.io/v4/weather/forecast?location={lat},{lon}&apikey={key}&units=metric&timesteps=1h&startTime=now&endTime=nowPlus{horas}h"
+    ACCU_GEO_URL_TEMPLATE = "https://dataservice.accuweather.com/locations/v1/cities/geoposition/search?apikey={key}&q={lat},{lon}&language=es"
+    ACCU_URL_TEMPLATE = "https://dataservice.accuweather.com/currentconditions/v1/{loc_key}?apikey={key}&language=es&details=true"
+    ACCU_FORECAST_URL_TEMPLATE = "https://dataservice.accuweather.com/forecasts/v1/hourly/{horas}hour/{loc_key}?apikey={key}&language=es&details=true&metric=true"
+    VC_URL_TEMPLATE = "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{lat},{lon}?key={key}&unitGroup=metric&include=current"
+    VC_FORECAST_URL_TEMPLATE = "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{lat},{lon}/{date1}/{date2}?key={key}&unitGroup=metric&include=hours"
+
+    # Caché de resultados: celdas de 0.01° (≈1.1 km en el ecuador), 128 entradas.
+    # El tiempo actual caduca a los 10 minutos; los pronósticos, a los 30 o al cambiar la hora.
+    CACHE_TTL_ACTUAL = 600
+    CACHE_TTL_PRONOSTICO = 1800
+    CACHE_MAX = 128
+    # Clicks más seguidos que esto se agrupan: solo se consulta el último
+    CLICK_DEBOUNCE_MS = 300
+    # Location Keys de AccuWeather: estables, solo se limita el número de celdas
+    ACCU_LOC_CACHE_MAX = 256
 
     def __init__(self, iface):
         """Inicializa el plugin."""
@@ -54,15 +126,36 @@ class ClimaPorClick:
         self.canvas = iface.mapCanvas()
         self.toolbar = self.action = self.config_action = self.tool = None
         self.menu = None
+        self._popup = None
+        # Pronósticos abiertos; se guarda la referencia para que Python no los recolecte
+        self._open_popups = set()
         self.settings = QSettings()
+        self._settings_cache = {}
+        self._wgs84 = QgsCoordinateReferenceSystem("EPSG:4326")
+        self._xform_cache = {}
+        self._accu_loc_cache = OrderedDict()
+        self._replies = set()
+        self._wx_cache = OrderedDict()
+        self._pending_point = None
+        self._click_timer = QTimer()
+        self._click_timer.setSingleShot(True)
+        self._click_timer.setInterval(self.CLICK_DEBOUNCE_MS)
+        self._click_timer.timeout.connect(self._do_click)
+        self._api_dispatch = {
+            "openweathermap": self._openweathermap,
+            "openmeteo": self._openmeteo,
+            "tomorrowio": self._tomorrowio,
+            "accuweather": self._accuweather,
+            "visualcrossing": self._visualcrossing,
+        }
         self.load_settings()
 
     def initGui(self):
         """Configura la interfaz gráfica (toolbar y menú) con los íconos específicos."""
         plugin_dir = os.path.dirname(os.path.abspath(__file__))
-        
+
         # Uso de los íconos solicitados
-        icon_api = QIcon(os.path.join(plugin_dir, 'icon_api.png')) 
+        icon_api = QIcon(os.path.join(plugin_dir, 'icon_api.png'))
         icon_config = QIcon(os.path.join(plugin_dir, 'icon_config.png'))
 
         self.toolbar = self.iface.addToolBar("Clima por Click")
@@ -85,6 +178,8 @@ class ClimaPorClick:
         self.menu.addAction(self.config_action)
         self.iface.pluginMenu().addMenu(self.menu)
 
+        self.canvas.destinationCrsChanged.connect(self._clear_xform_cache)
+
     def unload(self):
         """Limpia la interfaz al desactivar el plugin."""
         if self.toolbar:
@@ -95,23 +190,79 @@ class ClimaPorClick:
             self.menu.deleteLater()
         if self.tool and self.canvas.mapTool() == self.tool:
             self.canvas.unsetMapTool(self.tool)
+        if self._popup:
+            self._popup.deleteLater()
+            self._popup = None
+        for dlg in list(self._open_popups):
+            dlg.close()
+            dlg.deleteLater()
+        self._open_popups.clear()
+        self._click_timer.stop()
+        # Cancelar las consultas en curso para que no abran popups tras descargar
+        for reply in list(self._replies):
+            reply.abort()
+        self.canvas.destinationCrsChanged.disconnect(self._clear_xform_cache)
+        self._clear_xform_cache()
+
+    def _clear_xform_cache(self):
+        """Descarta las transformaciones cacheadas (p. ej. al cambiar el CRS del mapa)."""
+        self._xform_cache.clear()
+
+    def _to_wgs84(self, src_crs):
+        """Devuelve la transformación src_crs → WGS84, construyéndola una sola vez por CRS."""
+        key = src_crs.authid() or src_crs.toWkt()
+        xform = self._xform_cache.get(key)
+        if xform is None:
+            xform = QgsCoordinateTransform(src_crs, self._wgs84, QgsProject.instance())
+            self._xform_cache[key] = xform
+        return xform
+
+    def _get_setting(self, key, default=""):
+        """
+        Lee un valor de QSettings, consultando el backend solo la primera vez.
+        Debe llamarse dentro del grupo "ClimaPorClick".
+        """
+        if key not in self._settings_cache:
+            self._settings_cache[key] = self.settings.value(key, default, type=str)
+        return self._settings_cache[key]
+
+    def _set_setting(self, key, value):
+        """
+        Escribe un valor en QSettings solo si cambió respecto al cacheado.
+        Debe llamarse dentro del grupo "ClimaPorClick"; devuelve True si escribió.
+        """
+        if self._settings_cache.get(key) == value:
+            return False
+        self._settings_cache[key] = value
+        self.settings.setValue(key, value)
+        return True
 
     def load_settings(self):
         """Carga la configuración guardada."""
-        self.api_id = self.settings.value("ClimaPorClick/api_id", "openmeteo", type=str)
-        self.api_key = self.settings.value(f"ClimaPorClick/api_key_{self.api_id}", "", type=str)
-        self.modo = self.settings.value("ClimaPorClick/modo", "Tiempo Actual", type=str)
+        self.settings.beginGroup("ClimaPorClick")
+        try:
+            self.api_id = self._get_setting("api_id", "openmeteo")
+            self.api_key = self._get_setting(f"api_key_{self.api_id}", "")
+            self.modo = self._get_setting("modo", "Tiempo Actual")
+        finally:
+            self.settings.endGroup()
 
     def save_settings(self):
-        """Guarda la configuración actual."""
-        self.settings.setValue("ClimaPorClick/api_id", self.api_id)
-        self.settings.setValue(f"ClimaPorClick/api_key_{self.api_id}", self.api_key or "")
-        self.settings.setValue("ClimaPorClick/modo", self.modo)
+        """Guarda la configuración actual con una única escritura a disco."""
+        self.settings.beginGroup("ClimaPorClick")
+        try:
+            changed = self._set_setting("api_id", self.api_id)
+            changed |= self._set_setting(f"api_key_{self.api_id}", self.api_key or "")
+            changed |= self._set_setting("modo", self.modo)
+        finally:
+            self.settings.endGroup()
+        if changed:
+            self.settings.sync()
 
     def show_config_dialog(self, ask_key_only=False):
         """Muestra el diálogo de configuración de API y modo."""
         if ask_key_only:
-            name = next(n for n, i in self.API_OPTIONS.items() if i == self.api_id)
+            name = self.API_REVERSE.get(self.api_id, self.api_id)
             text, ok = QInputDialog.getText(
                 self.iface.mainWindow(), f"API Key para {name}",
                 "Introduce tu API Key:", QLineEdit.Normal, self.api_key or ""
@@ -130,13 +281,9 @@ class ClimaPorClick:
         combo_api = QComboBox()
         for n in self.API_OPTIONS.keys():
             combo_api.addItem(n)
-        try:
-            idx = list(self.API_OPTIONS.keys()).index(
-                next(n for n, i in self.API_OPTIONS.items() if i == self.api_id)
-            )
+        idx = combo_api.findText(self.API_REVERSE.get(self.api_id, ""))
+        if idx >= 0:
             combo_api.setCurrentIndex(idx)
-        except StopIteration:
-            pass
         layout.addWidget(lbl_api)
         layout.addWidget(combo_api)
 
@@ -192,276 +339,342 @@ class ClimaPorClick:
         )
 
     def on_map_click(self, point, _):
-        """Maneja el evento de click en el mapa."""
+        """Maneja el evento de click en el mapa (con debounce: vale el último click)."""
+        self._pending_point = point
+        self._click_timer.start()
+
+    def _do_click(self):
+        """Consulta el clima para el último punto clickeado."""
         try:
             # Transformar coordenadas a WGS84 (EPSG:4326)
             src_crs = self.canvas.mapSettings().destinationCrs()
-            dst_crs = QgsCoordinateReferenceSystem("EPSG:4326")
-            xform = QgsCoordinateTransform(src_crs, dst_crs, QgsProject.instance())
-            wgs_pt = xform.transform(point)
+            wgs_pt = self._to_wgs84(src_crs).transform(self._pending_point)
             lat, lon = wgs_pt.y(), wgs_pt.x()
 
             horas = 0
             if self.modo.startswith("Pronóstico"):
                 horas = int(self.modo.split()[1].replace("h", ""))
-            
-            data = self.get_weather(lat, lon, horas)
-            
+        except (QgsCsException, IndexError, ValueError) as e:
+            log.exception("Error en click")
+            self._show_error("Error", f"Error: {e}")
+            return
+
+        def mostrar(data):
             if data:
                 self.show_weather_popup(data, horas > 0)
-        except Exception as e:
-            log.exception("Error en click")
-            QMessageBox.critical(self.iface.mainWindow(), "Error", f"Error: {e}")
 
-    def get_weather(self, lat, lon, horas=0):
-        """Función genérica para llamar a la API seleccionada."""
+        # La consulta es asíncrona: el popup se abre al llegar la respuesta
+        # (o en el acto si está en caché); sus fallos no pasan por el except de arriba
+        self.get_weather(lat, lon, horas, mostrar)
+
+    def get_weather(self, lat, lon, horas, callback):
+        """
+        Lanza la consulta a la API seleccionada sin bloquear la interfaz.
+        `callback` recibe la lista de datos cuando llega la respuesta.
+        """
+        fn = self._api_dispatch.get(self.api_id)
+        if fn is None:
+            self._show_error("Error", f"API desconocida: {self.api_id}")
+            return
+
+        # Los pronósticos empiezan en la hora actual: la hora forma parte de la clave
+        # para no reutilizar una tabla cuya primera fila ya pasó
+        hora = int(time.time() // 3600) if horas else 0
+        key = (self.api_id, round(lat, 2), round(lon, 2), horas, hora)
+        hit = self._wx_cache.get(key)
+        ttl = self.CACHE_TTL_PRONOSTICO if horas else self.CACHE_TTL_ACTUAL
+        if hit and time.monotonic() - hit[0] < ttl:
+            self._wx_cache.move_to_end(key)
+            callback(hit[1])
+            return
+
+        def store(datos):
+            if datos:
+                self._wx_cache[key] = (time.monotonic(), datos)
+                self._wx_cache.move_to_end(key)
+                while len(self._wx_cache) > self.CACHE_MAX:
+                    self._wx_cache.popitem(last=False)
+            callback(datos)
+
+        fn(lat, lon, horas, store)
+
+    def _show_error(self, title, msg):
+        """Muestra un mensaje de error modal."""
+        QMessageBox.critical(self.iface.mainWindow(), title, msg)
+
+    def _fetch(self, url, parse, deliver):
+        """
+        Lanza un GET asíncrono con el gestor de red de QGIS.
+        `parse` recibe el JSON y devuelve el resultado, que se pasa a `deliver`.
+        """
+        reply = QgsNetworkAccessManager.instance().get(QNetworkRequest(QUrl(url)))
+        self._replies.add(reply)
+        reply.finished.connect(lambda: self._on_reply(reply, parse, deliver))
+
+    def _on_reply(self, reply, parse, deliver):
+        """Procesa una respuesta de red: la interpreta con `parse` y entrega el resultado."""
+        self._replies.discard(reply)
+        try:
+            if reply.error() == QNetworkReply.OperationCanceledError:
+                return
+            if reply.error() != QNetworkReply.NoError:
+                self._show_error("Error de red", f"No se pudo conectar: {reply.errorString()}")
+                return
+            body = bytes(reply.readAll())
+        finally:
+            reply.deleteLater()
         try:
-            if self.api_id == "openweathermap":
-                return self._openweathermap(lat, lon, horas)
-            elif self.api_id == "openmeteo":
-                return self._openmeteo(lat, lon, horas)
-            elif self.api_id == "tomorrowio":
-                return self._tomorrowio(lat, lon, horas)
-            elif self.api_id == "accuweather":
-                return self._accuweather(lat, lon, horas)
-            elif self.api_id == "visualcrossing":
-                return self._visualcrossing(lat, lon, horas)
-            return None
-        except requests.RequestException as e:
-            QMessageBox.critical(self.iface.mainWindow(), "Error de red", f"No se pudo conectar: {e}")
-            return None
-        except Exception as e:
+            result = parse(_json_loads(body))
+        except (AttributeError, KeyError, IndexError, TypeError, ValueError) as e:
+            # Solo errores de datos (JSON inválido o respuesta con otro formato)
             log.exception("Error API")
-            QMessageBox.critical(self.iface.mainWindow(), "Error", f"Error en {self.api_id}: {e}")
-            return None
+            self._show_error("Error", f"Error en {self.api_id}: {e}")
+            return
+        # La entrega (caché y popup) queda fuera del try: sus fallos llegan sin filtrar
+        deliver(result)
 
-    def _openweathermap(self, lat, lon, horas):
+    def _openweathermap(self, lat, lon, horas, callback):
         """Obtiene datos de OpenWeatherMap."""
         if horas == 0:
-            url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={self.api_key}&units=metric&lang=es"
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            d = r.json()
-            return [{
-                "hora": "Ahora", "temp": round(d["main"]["temp"], 1), "feels": round(d["main"]["feels_like"], 1),
-                "desc": d["weather"][0]["description"].capitalize(), "icon": d["weather"][0]["icon"],
-                "hum": d["main"]["humidity"], "viento_kmh": round(d["wind"].get("speed", 0) * 3.6, 1),
-                "dir": d["wind"].get("deg", 0), "rafaga": round(d["wind"].get("gust", 0) * 3.6, 1),
-                "ciudad": d.get("name", "Ubicación")
-            }]
+            url = self.OWM_URL_TEMPLATE.format(lat=lat, lon=lon, key=self.api_key)
+
+            def parse(d):
+                return [Row(
+                    hora="Ahora", temp=round(d["main"]["temp"], 1), feels=round(d["main"]["feels_like"], 1),
+                    desc=d["weather"][0]["description"].capitalize(), icon=self._owm_icon(d["weather"][0]["icon"]),
+                    hum=d["main"]["humidity"], viento_kmh=round(d["wind"].get("speed", 0) * _KMH, 1),
+                    dir=d["wind"].get("deg", 0), rafaga=round(d["wind"].get("gust", 0) * _KMH, 1),
+                    ciudad=d.get("name", "Ubicación")
+                )]
         else:
-            url = f"https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&appid={self.api_key}&units=metric&lang=es&exclude=current,minutely,daily,alerts"
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            data = r.json()["hourly"][:horas]
-            return [{
-                "hora": datetime.fromtimestamp(h["dt"]).strftime("%H:%M"), "temp": round(h["temp"], 1),
-                "feels": round(h["feels_like"], 1), "desc": h["weather"][0]["description"].capitalize(),
-                "icon": h["weather"][0]["icon"], "hum": h["humidity"],
-                "viento_kmh": round(h["wind_speed"] * 3.6, 1), "dir": h["wind_deg"],
-                "rafaga": round(h.get("wind_gust", 0) * 3.6, 1), "ciudad": "Pronóstico"
-            } for h in data]
-
-    def _openmeteo(self, lat, lon, horas):
+            url = self.OWM_FORECAST_URL_TEMPLATE.format(lat=lat, lon=lon, key=self.api_key)
+
+            def parse(payload):
+                data = payload["hourly"][:horas]
+                return [Row(
+                    hora=time.strftime("%H:%M", time.localtime(h["dt"])), temp=round(h["temp"], 1),
+                    feels=round(h["feels_like"], 1), desc=h["weather"][0]["description"].capitalize(),
+                    icon=self._owm_icon(h["weather"][0]["icon"]), hum=h["humidity"],
+                    viento_kmh=round(h["wind_speed"] * _KMH, 1), dir=h["wind_deg"],
+                    rafaga=round(h.get("wind_gust", 0) * _KMH, 1), ciudad="Pronóstico"
+                ) for h in data]
+        self._fetch(url, parse, callback)
+
+    def _owm_icon(self, code):
+        """Traduce el código de ícono de OpenWeatherMap a emoji (o lo deja tal cual)."""
+        return self.ICON_MAP.get(code, code)
+
+    def _wmo(self, code):
+        """Devuelve (descripción, emoji) para un código WMO."""
+        # Acepta lo mismo que WMO_WEATHER_MAP.get: también floats enteros como 2.0
+        try:
+            if 0 <= code < 100 and code == int(code):
+                return self._WMO_TABLE[int(code)]
+        except (TypeError, ValueError):
+            pass
+        return self.WMO_UNKNOWN
+
+    def _openmeteo(self, lat, lon, horas, callback):
         """Obtiene datos de Open-Meteo."""
         if horas == 0:
-            url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,apparent_temperature,relative_humidity_2m,wind_speed_10m,wind_direction_10m,wind_gusts_10m,weather_code"
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            d = r.json()["current"]
-            code = d.get("weather_code", 0)
-            desc, icon = self.WMO_WEATHER_MAP.get(code, ("Desconocido", "❓"))
-            return [{
-                "hora": "Ahora", "temp": round(d["temperature_2m"], 1), "feels": round(d["apparent_temperature"], 1),
-                "desc": desc, "icon": icon, "hum": d["relative_humidity_2m"],
-                "viento_kmh": round(d["wind_speed_10m"], 1), "dir": d["wind_direction_10m"],
-                "rafaga": round(d.get("wind_gusts_10m", 0), 1), "ciudad": "Ubicación"
-            }]
+            url = self.OPENMETEO_URL_TEMPLATE.format(lat=lat, lon=lon)
+
+            def parse(payload):
+                d = payload["current"]
+                desc, icon = self._wmo(d.get("weather_code", 0))
+                return [Row(
+                    hora="Ahora", temp=round(d["temperature_2m"], 1), feels=round(d["apparent_temperature"], 1),
+                    desc=desc, icon=icon, hum=d["relative_humidity_2m"],
+                    viento_kmh=round(d["wind_speed_10m"], 1), dir=d["wind_direction_10m"],
+                    rafaga=round(d.get("wind_gusts_10m", 0), 1), ciudad="Ubicación"
+                )]
         else:
-            days = (horas // 24) + 1
-            url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&hourly=temperature_2m,apparent_temperature,relative_humidity_2m,wind_speed_10m,wind_direction_10m,weather_code&forecast_days={days}"
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            data = r.json()["hourly"]
-            result = []
-            for i in range(horas):
-                code = data["weather_code"][i]
-                desc, icon = self.WMO_WEATHER_MAP.get(code, ("Desconocido", "❓"))
-                result.append({
-                    "hora": datetime.fromisoformat(data["time"][i]).strftime("%H:%M"),
-                    "temp": round(data["temperature_2m"][i], 1), "feels": round(data["apparent_temperature"][i], 1),
-                    "desc": desc, "icon": icon, "hum": data["relative_humidity_2m"][i],
-                    "viento_kmh": round(data["wind_speed_10m"][i], 1), "dir": data["wind_direction_10m"][i],
-                    "rafaga": 0, "ciudad": "Pronóstico"
-                })
-            return result
-
-    def _tomorrowio(self, lat, lon, horas):
+            url = self.OPENMETEO_FORECAST_URL_TEMPLATE.format(lat=lat, lon=lon, horas=horas)
+
+            def parse(payload):
+                data = payload["hourly"]
+                result = []
+                for t, temp, feels, hum, ws, wd, wc in zip(
+                    data["time"], data["temperature_2m"], data["apparent_temperature"],
+                    data["relative_humidity_2m"], data["wind_speed_10m"], data["wind_direction_10m"],
+                    data["weather_code"]
+                ):
+                    desc, icon = self._wmo(wc)
+                    result.append(Row(
+                        hora=t[11:16], temp=round(temp, 1), feels=round(feels, 1),
+                        desc=desc, icon=icon, hum=hum, viento_kmh=round(ws, 1), dir=wd,
+                        rafaga=0, ciudad="Pronóstico"
+                    ))
+                return result
+        self._fetch(url, parse, callback)
+
+    def _tomorrowio(self, lat, lon, horas, callback):
         """Obtiene datos de Tomorrow.io."""
         if horas == 0:
-            url = f"https://api.tomorrow.io/v4/weather/realtime?location={lat},{lon}&apikey={self.api_key}&units=metric"
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            vals = r.json()["data"]["values"]
-            code = vals.get("weatherCode", 0)
-            desc, icon = self.WMO_WEATHER_MAP.get(code, ("Desconocido", "❓"))
-            return [{
-                "hora": "Ahora", "temp": round(vals["temperature"], 1), "feels": round(vals["temperatureApparent"], 1),
-                "desc": desc, "icon": icon, "hum": vals["humidity"],
-                "viento_kmh": round(vals["windSpeed"] * 3.6, 1), "dir": vals["windDirection"],
-                "rafaga": round(vals.get("windGust", 0) * 3.6, 1),
-                "ciudad": r.json().get("location", {}).get("name", "Ubicación")
-            }]
+            url = self.TOMORROWIO_URL_TEMPLATE.format(lat=lat, lon=lon, key=self.api_key)
+
+            def parse(payload):
+                vals = payload["data"]["values"]
+                desc, icon = self._wmo(vals.get("weatherCode", 0))
+                return [Row(
+                    hora="Ahora", temp=round(vals["temperature"], 1), feels=round(vals["temperatureApparent"], 1),
+                    desc=desc, icon=icon, hum=vals["humidity"],
+                    viento_kmh=round(vals["windSpeed"] * _KMH, 1), dir=vals["windDirection"],
+                    rafaga=round(vals.get("windGust", 0) * _KMH, 1),
+                    ciudad=payload.get("location", {}).get("name", "Ubicación")
+                )]
         else:
-            url = f"https://api.tomorrow.io/v4/weather/forecast?location={lat},{lon}&apikey={self.api_key}&units=metric&timesteps=1h&startTime=now&endTime=nowPlus{horas}h"
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            intervals = r.json()["data"]["timelines"][0]["intervals"][:horas]
-            return [{
-                "hora": datetime.fromisoformat(i["startTime"].replace("Z", "+00:00")).strftime("%H:%M"),
-                "temp": round(i["values"]["temperature"], 1), "feels": round(i["values"]["temperatureApparent"], 1),
-                "desc": self.WMO_WEATHER_MAP.get(i["values"].get("weatherCode", 0), ("Desconocido", "❓"))[0],
-                "icon": self.WMO_WEATHER_MAP.get(i["values"].get("weatherCode", 0), ("", "❓"))[1],
-                "hum": i["values"]["humidity"], "viento_kmh": round(i["values"]["windSpeed"] * 3.6, 1),
-                "dir": i["values"]["windDirection"], "rafaga": round(i["values"].get("windGust", 0) * 3.6, 1),
-                "ciudad": "Pronóstico"
-            } for i in intervals]
-
-    def _accuweather(self, lat, lon, horas):
-        """Obtiene datos de AccuWeather."""
-        geo = f"http://dataservice.accuweather.com/locations/v1/cities/geoposition/search?apikey={self.api_key}&q={lat},{lon}&language=es"
-        r_geo = requests.get(geo, timeout=10)
-        r_geo.raise_for_status()
-        loc = r_geo.json()
-        key = loc["Key"]
-        ciudad = loc.get("LocalizedName", "Ubicación")
+            url = self.TOMORROWIO_FORECAST_URL_TEMPLATE.format(lat=lat, lon=lon, key=self.api_key, horas=horas)
+
+            def parse(payload):
+                intervals = payload["data"]["timelines"][0]["intervals"][:horas]
+                result = []
+                for i in intervals:
+                    v = i["values"]
+                    desc, icon = self._wmo(v.get("weatherCode", 0))
+                    result.append(Row(
+                        hora=i["startTime"][11:16],
+                        temp=round(v["temperature"], 1), feels=round(v["temperatureApparent"], 1),
+                        desc=desc, icon=icon,
+                        hum=v["humidity"], viento_kmh=round(v["windSpeed"] * _KMH, 1),
+                        dir=v["windDirection"], rafaga=round(v.get("windGust", 0) * _KMH, 1),
+                        ciudad="Pronóstico"
+                    ))
+                return result
+        self._fetch(url, parse, callback)
+
+    def _accuweather(self, lat, lon, horas, callback):
+        """Obtiene datos de AccuWeather (geoposición y luego condiciones/pronóstico)."""
+        # El Location Key se cachea por celdas de ~0.01° (≈1 km): evita la primera consulta
+        cache_key = (round(lat, 2), round(lon, 2))
+        cached = self._accu_loc_cache.get(cache_key)
+        if cached:
+            self._accu_loc_cache.move_to_end(cache_key)
+            self._accuweather_datos(*cached, horas, callback)
+            return
+
+        geo = self.ACCU_GEO_URL_TEMPLATE.format(lat=lat, lon=lon, key=self.api_key)
 
+        def parse_geo(loc):
+            return loc["Key"], loc.get("LocalizedName", "Ubicación")
+
+        def usar_loc(loc):
+            self._accu_loc_cache[cache_key] = loc
+            if len(self._accu_loc_cache) > self.ACCU_LOC_CACHE_MAX:
+                self._accu_loc_cache.popitem(last=False)
+            self._accuweather_datos(*loc, horas, callback)
+        self._fetch(geo, parse_geo, usar_loc)
+
+    def _accuweather_datos(self, key, ciudad, horas, callback):
+        """Segunda consulta de AccuWeather, una vez conocido el Location Key."""
         if horas == 0:
-            cur = f"http://dataservice.accuweather.com/currentconditions/v1/{key}?apikey={self.api_key}&language=es&details=true"
-            r = requests.get(cur, timeout=10)
-            r.raise_for_status()
-            d = r.json()[0]
-            return [{
-                "hora": "Ahora", "temp": round(d["Temperature"]["Metric"]["Value"], 1),
-                "feels": round(d["RealFeelTemperature"]["Metric"]["Value"], 1), "desc": d["WeatherText"],
-                "icon": f"{d['WeatherIcon']:02d}", "hum": d["RelativeHumidity"],
-                "viento_kmh": round(d["Wind"]["Speed"]["Metric"]["Value"], 1), "dir": d["Wind"]["Direction"]["Degrees"],
-                "rafaga": round(d["WindGust"]["Speed"]["Metric"]["Value"], 1), "ciudad": ciudad
-            }]
+            cur = self.ACCU_URL_TEMPLATE.format(loc_key=key, key=self.api_key)
+
+            def parse(payload):
+                d = payload[0]
+                return [Row(
+                    hora="Ahora", temp=round(d["Temperature"]["Metric"]["Value"], 1),
+                    feels=round(d["RealFeelTemperature"]["Metric"]["Value"], 1), desc=d["WeatherText"],
+                    icon=f"{d['WeatherIcon']:02d}", hum=d["RelativeHumidity"],
+                    viento_kmh=round(d["Wind"]["Speed"]["Metric"]["Value"], 1), dir=d["Wind"]["Direction"]["Degrees"],
+                    rafaga=round(d["WindGust"]["Speed"]["Metric"]["Value"], 1), ciudad=ciudad
+                )]
+            self._fetch(cur, parse, callback)
         else:
-            fc = f"http://dataservice.accuweather.com/forecasts/v1/hourly/{horas}hour/{key}?apikey={self.api_key}&language=es&details=true&metric=true"
-            r = requests.get(fc, timeout=10)
-            r.raise_for_status()
-            data = r.json()[:horas]
-            return [{
-                "hora": datetime.fromisoformat(h["DateTime"][:-6]).strftime("%H:%M"),
-                "temp": round(h["Temperature"]["Value"], 1), "feels": round(h["RealFeelTemperature"]["Value"], 1),
-                "desc": h["IconPhrase"], "icon": f"{h['WeatherIcon']:02d}", "hum": h["RelativeHumidity"],
-                "viento_kmh": round(h["Wind"]["Speed"]["Value"] * 3.6, 1), "dir": h["Wind"]["Direction"]["Degrees"],
-                "rafaga": round(h["WindGust"]["Speed"]["Value"] * 3.6, 1), "ciudad": ciudad
-            } for h in data]
-
-    def _visualcrossing(self, lat, lon, horas):
+            fc = self.ACCU_FORECAST_URL_TEMPLATE.format(loc_key=key, key=self.api_key, horas=horas)
+
+            def parse(payload):
+                data = payload[:horas]
+                return [Row(
+                    hora=h["DateTime"][11:16],
+                    temp=round(h["Temperature"]["Value"], 1), feels=round(h["RealFeelTemperature"]["Value"], 1),
+                    desc=h["IconPhrase"], icon=f"{h['WeatherIcon']:02d}", hum=h["RelativeHumidity"],
+                    viento_kmh=round(h["Wind"]["Speed"]["Value"], 1), dir=h["Wind"]["Direction"]["Degrees"],
+                    rafaga=round(h["WindGust"]["Speed"]["Value"], 1), ciudad=ciudad
+                ) for h in data]
+            self._fetch(fc, parse, callback)
+
+    def _visualcrossing(self, lat, lon, horas, callback):
         """Obtiene datos de Visual Crossing."""
-        url = f"https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{lat},{lon}?key={self.api_key}&unitGroup=metric&include=current"
-        if horas > 0:
-            from datetime import timedelta
-            now = datetime.now()
-            end = now + timedelta(hours=horas)
-            url += f"&startDateTime={now.strftime('%Y-%m-%dT%H:00:00')}&endDateTime={end.strftime('%Y-%m-%dT%H:00:00')}"
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        d = r.json()
-        
         if horas == 0:
-            cur = d["currentConditions"]
-            return [{
-                "hora": "Ahora", "temp": round(cur["temp"], 1), "feels": round(cur["feelslike"], 1),
-                "desc": cur["conditions"], "icon": cur["icon"], "hum": cur["humidity"],
-                "viento_kmh": round(cur["windspeed"], 1), "dir": cur["winddir"],
-                "rafaga": round(cur.get("windgust", 0), 1), "ciudad": "Ubicación"
-            }]
+            url = self.VC_URL_TEMPLATE.format(lat=lat, lon=lon, key=self.api_key)
         else:
-            result = []
+            # Ventana calculada una sola vez: sirve para la URL y para filtrar la respuesta.
+            # La API recibe el rango de días en la ruta; las horas se recortan aquí.
             now = datetime.now()
             end = now + timedelta(hours=horas)
+            url = self.VC_FORECAST_URL_TEMPLATE.format(
+                lat=lat, lon=lon, key=self.api_key,
+                date1=now.date().isoformat(), date2=end.date().isoformat()
+            )
+            # Límites como texto ISO: el orden lexicográfico coincide con el cronológico
+            desde = now.strftime("%Y-%m-%dT%H:%M:%S")
+            hasta = end.strftime("%Y-%m-%dT%H:%M:%S")
+
+        def parse(d):
+            if horas == 0:
+                cur = d["currentConditions"]
+                return [Row(
+                    hora="Ahora", temp=round(cur["temp"], 1), feels=round(cur["feelslike"], 1),
+                    desc=cur["conditions"], icon=cur["icon"], hum=cur["humidity"],
+                    viento_kmh=round(cur["windspeed"], 1), dir=cur["winddir"],
+                    rafaga=round(cur.get("windgust", 0), 1), ciudad="Ubicación"
+                )]
+            result = []
             for day in d["days"]:
+                fecha = day["datetime"]
                 for h in day["hours"]:
-                    dt = datetime.fromisoformat(h["datetime"])
-                    if now <= dt <= end:
-                        result.append({
-                            "hora": dt.strftime("%H:%M"), "temp": round(h["temp"], 1), "feels": round(h["feelslike"], 1),
-                            "desc": h["conditions"], "icon": h["icon"], "hum": h["humidity"],
-                            "viento_kmh": round(h["windspeed"], 1), "dir": h["winddir"],
-                            "rafaga": round(h.get("windgust", 0), 1), "ciudad": "Pronóstico"
-                        })
-                    if len(result) >= horas:
+                    # h["datetime"] es solo la hora ("HH:MM:SS"); se compara sin construir datetimes
+                    stamp = f"{fecha}T{h['datetime']}"
+                    if stamp < desde:
+                        continue
+                    if stamp > hasta or len(result) >= horas:
                         return result
-            return result[:horas]
+                    result.append(Row(
+                        hora=h["datetime"][:5], temp=round(h["temp"], 1), feels=round(h["feelslike"], 1),
+                        desc=h["conditions"], icon=h["icon"], hum=h["humidity"],
+                        viento_kmh=round(h["windspeed"], 1), dir=h["winddir"],
+                        rafaga=round(h.get("windgust", 0), 1), ciudad="Pronóstico"
+                    ))
+            return result
+        self._fetch(url, parse, callback)
 
     def show_weather_popup(self, datos, es_pronostico):
         """
         Muestra el popup de clima utilizando un QDialog con QTextBrowser 
         para permitir el scroll vertical en pronósticos largos.
         """
-        icon_map = {
-            '01d': '☀️', '01n': '🌙', '02d': '🌤️', '02n': '🌤️', '03d': '🌥️', '03n': '🌥️',
-            '04d': '☁️', '04n': '☁️', '09d': '🌧️', '09n': '🌧️', '10d': '🌦️', '10n': '🌧️',
-            '11d': '⛈️', '11n': '⛈️', '13d': '❄️', '13n': '❄️', '50d': '🌫️', '50n': '🌫️',
-        }
-        
-        # 1. Definición del CSS (CORREGIDO Y CERRADO)
-        css_style = """
-            <style>
-                body { font-family: sans-serif; margin: 0; padding: 0; }
-                table { border-collapse: collapse; width: 100%; font-size: 10px; margin-top: 10px; }
-                th, td { border: 1px solid #ddd; padding: 4px; text-align: center; }
-                th { background-color: #f2f2f2; font-weight: bold; }
-                .city-header { font-size: 14px; font-weight: bold; margin-bottom: 5px; }
-                hr { border: 0; border-top: 1px solid #ccc; margin: 5px 0; }
-            </style>
-        """ # <-- CIERRE DE LA CADENA DE TEXTO (Línea 278 en el código original)
-        
-        html = css_style
-        html += f"<div class='city-header'>{datos[0]['ciudad']}</div>"
+        # El HTML se acumula en una lista y se une una sola vez al final
+        parts = [self._CSS_STYLE, f"<div class='city-header'>{datos[0].ciudad}</div>"]
 
         if es_pronostico:
             # --- FORMATO TABULAR PARA PRONÓSTICO (con scroll) ---
-            html += f"<i>Pronóstico {len(datos)}h ({self.api_id})</i><hr>"
-            
+            parts.append(f"<i>Pronóstico {len(datos)}h ({self.api_id})</i><hr>")
+
             # Encabezados de la tabla solicitados
-            html += "<table><thead><tr>"
-            html += "<th>Hora</th><th>Temp.</th><th>Sens. Térm.</th><th>Estado</th><th>Humedad</th><th>Dir Viento</th><th>Vel Viento</th><th>Ráfaga</th>"
-            html += "</tr></thead><tbody>"
+            parts.append(
+                "<table><thead><tr>"
+                "<th>Hora</th><th>Temp.</th><th>Sens. Térm.</th><th>Estado</th><th>Humedad</th><th>Dir Viento</th><th>Vel Viento</th><th>Ráfaga</th>"
+                "</tr></thead><tbody>"
+            )
 
             # Filas de datos
             for d in datos:
-                icon = icon_map.get(d.get('icon'), d.get('icon', '')) if self.api_id == "openweathermap" else d.get('icon', '')
-                
-                # Extracción de datos con valor predeterminado '-' para robustez
-                temp = d.get('temp', '-')
-                feels = d.get('feels', '-')
-                desc = d.get('desc', '-')
-                hum = d.get('hum', '-')
-                dir_grados = d.get('dir', '-')
-                viento_kmh = d.get('viento_kmh', '-')
-                rafaga = d.get('rafaga', '-')
-                
-                # Nueva fila
-                html += "<tr>"
-                html += f"<td><b>{d['hora']}</b></td>"
-                html += f"<td>{temp}°C</td>"
-                html += f"<td>{feels}°C</td>"
-                html += f"<td>{icon} {desc}</td>"
-                html += f"<td>{hum}%</td>"
-                html += f"<td>{dir_grados}°</td>"
-                html += f"<td>{viento_kmh} km/h</td>"
-                html += f"<td>{rafaga} km/h</td>"
-                html += "</tr>"
-
-            html += "</tbody></table>"
+                parts.append(
+                    f"<tr><td><b>{d.hora}</b></td>"
+                    f"<td>{d.temp}°C</td>"
+                    f"<td>{d.feels}°C</td>"
+                    f"<td>{d.icon} {d.desc}</td>"
+                    f"<td>{d.hum}%</td>"
+                    f"<td>{d.dir}°</td>"
+                    f"<td>{d.viento_kmh} km/h</td>"
+                    f"<td>{d.rafaga} km/h</td></tr>"
+                )
+
+            parts.append("</tbody></table>")
+            html = "".join(parts)
             # ------------------------------------------------
-            
+
             # 2. Uso de QDialog y QTextBrowser para el scroll
             dlg = QDialog(self.iface.mainWindow())
             dlg.setWindowTitle("Pronóstico por Click")
@@ -469,8 +682,11 @@ class ClimaPorClick:
             main_layout = QVBoxLayout()
             
             browser = QTextBrowser()
+            # Solo lectura y sin enlaces: sin pila de deshacer ni resolución de URLs
+            browser.setUndoRedoEnabled(False)
+            browser.setOpenLinks(False)
             browser.setHtml(html)
-            browser.setMinimumSize(400, 300) 
+            browser.setMinimumSize(400, 300)
             browser.setMaximumSize(800, 600)
             
             main_layout.addWidget(browser)
@@ -480,22 +696,34 @@ class ClimaPorClick:
             main_layout.addWidget(btn_close)
             
             dlg.setLayout(main_layout)
-            dlg.exec_()
+            # No modal: el mapa sigue aceptando clicks mientras el pronóstico está abierto
+            dlg.finished.connect(lambda _, d=dlg: self._close_popup(d))
+            self._open_popups.add(dlg)
+            dlg.setModal(False)
+            dlg.show()
             
         else:
             # --- Formato para "Tiempo Actual" (sin scroll, usa QMessageBox) ---
             d = datos[0]
-            icon = icon_map.get(d['icon'], d['icon']) if self.api_id == "openweathermap" else d['icon']
-            html += f"<i>{d['desc']} ({self.api_id})</i><hr>"
-            html += f"Temperatura: <b>{d['temp']} °C</b> (Sens. {d['feels']} °C)<br>"
-            html += f"Humedad: {d['hum']} %<br>"
-            html += f"Viento: {d['viento_kmh']} km/h ({d['dir']} °)<br>"
-            html += f"Ráfaga: {d['rafaga']} km/h"
+            parts.append(_POPUP_TEMPLATE.format(api_id=self.api_id, **d._asdict()))
+            html = "".join(parts)
             
             self.iface.messageBar().clearWidgets()
-            QMessageBox.information(self.iface.mainWindow(), "Clima Actual", html)
-
+            # Un único QMessageBox no modal, reutilizado entre clicks
+            if self._popup is None:
+                self._popup = QMessageBox(self.iface.mainWindow())
+                self._popup.setWindowTitle("Clima Actual")
+                self._popup.setIcon(QMessageBox.Information)
+                self._popup.setModal(False)
+            self._popup.setText(html)
+            self._popup.show()
+            self._popup.raise_()
+
+    def _close_popup(self, dlg):
+        """Libera un pronóstico cerrado por el usuario."""
+        self._open_popups.discard(dlg)
+        dlg.deleteLater()
 
     def _requires_key(self):
         """Verifica si la API seleccionada requiere una clave."""
-        return any(self.api_id == i and "Requiere Key" in n for n, i in self.API_OPTIONS.items())
\ No newline at end of file
+        return self.api_id in self._KEY_REQUIRED
\ No newline at end of file